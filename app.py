@@ -1,27 +1,155 @@
-from flask import Flask, request, jsonify
-from flask_cors import CORS
+from quart import Quart, Response, request, make_response
+from quart_cors import cors
 from librus_api import LibrusAPI
+from session_store import create_session_store
+import aiohttp
 import asyncio
+import functools
+import hashlib
 import logging
+import orjson
 import uuid
 import time
-import requests
+from collections import OrderedDict
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
 
-app = Flask(__name__)
-CORS(app)
-
-# In-memory session storage (for free tier simplicity)
-# In production, use Redis or database
-sessions = {}
+app = Quart(__name__)
+app = cors(app)
 
 # Session timeout (30 minutes)
 SESSION_TIMEOUT = 30 * 60
 
+# Login attempts allowed per client per window (window in session_store).
+MAX_LOGIN_ATTEMPTS = 5
+
+# Redis when REDIS_URL is set (shared across workers), in-memory otherwise.
+session_store = create_session_store(SESSION_TIMEOUT)
+
+# Short-TTL response cache for polled GET endpoints, keyed per token.
+# Bounded LRU; a hit skips the entire Librus round-trip.
+RESPONSE_CACHE_MAX = 512
+response_cache = OrderedDict()
+
+def cached_response(ttl: float = 15):
+    """Cache a successful response for `ttl` seconds per (token, path, query).
+
+    Cached bodies carry an ETag; a matching If-None-Match gets an empty
+    304 without touching the handler or serializing anything. If the
+    handler fails with a 5xx while a stale entry exists, the stale
+    response is served instead with an X-Cache: STALE header, shielding
+    clients from transient Librus outages.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = (request.headers.get("Authorization", ""), request.path, request.query_string)
+            now = time.monotonic()
+            if_none_match = request.headers.get("If-None-Match")
+            entry = response_cache.get(key)
+            if entry and entry[0] > now:
+                response_cache.move_to_end(key)
+                _, status, content_type, body, etag = entry
+                if if_none_match == etag:
+                    return Response(b"", status=304, headers={"ETag": etag, "X-Cache": "HIT"})
+                response = Response(body, status=status, content_type=content_type)
+                response.headers["ETag"] = etag
+                response.headers["X-Cache"] = "HIT"
+                return response
+
+            response = await make_response(await func(*args, **kwargs))
+            if response.status_code == 200:
+                body = await response.get_data()
+                etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+                response_cache[key] = (now + ttl, response.status_code, response.content_type, body, etag)
+                response_cache.move_to_end(key)
+                while len(response_cache) > RESPONSE_CACHE_MAX:
+                    response_cache.popitem(last=False)
+                if if_none_match == etag:
+                    return Response(b"", status=304, headers={"ETag": etag})
+                response.headers["ETag"] = etag
+            elif response.status_code >= 500 and entry:
+                _, status, content_type, body, etag = entry
+                response = Response(body, status=status, content_type=content_type)
+                response.headers["ETag"] = etag
+                response.headers["X-Cache"] = "STALE"
+            return response
+        return wrapper
+    return decorator
+
+# In-flight Librus fetches keyed by (token, method). Concurrent identical
+# requests share one upstream call instead of each hitting Librus.
+inflight = {}
+
+async def singleflight(key, make_coro):
+    """Await a shared task for `key`, creating it from `make_coro` if absent."""
+    fut = inflight.get(key)
+    if fut is None:
+        fut = asyncio.ensure_future(make_coro())
+        inflight[key] = fut
+        fut.add_done_callback(lambda _: inflight.pop(key, None))
+    # Shield so one waiter being cancelled (e.g. client disconnect) detaches
+    # it without killing the shared fetch under the other waiters.
+    return await asyncio.shield(fut)
+
+def drop_cached_responses(auth: str) -> None:
+    """Drop all cached responses for an Authorization header value."""
+    for key in [k for k in response_cache if k[0] == auth]:
+        del response_cache[key]
+
+# How often the background sweeper clears expired sessions.
+SESSION_SWEEP_INTERVAL = 60
+
+async def _sweep_sessions_periodically():
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+        session_store.cleanup()
+
+@app.before_serving
+async def start_session_sweeper():
+    app.session_sweeper = asyncio.create_task(_sweep_sessions_periodically())
+
+@app.after_serving
+async def close_librus_session():
+    app.session_sweeper.cancel()
+    await LibrusAPI.close_shared_session()
+    if _edupage_session is not None and not _edupage_session.closed:
+        await _edupage_session.close()
+    await session_store.close()
+
 def make_trace_id() -> str:
     return uuid.uuid4().hex[:8]
 
+def fastjson(obj, status: int = 200) -> Response:
+    """Serialize a JSON response with orjson (UTF-8 bytes, no escaping)."""
+    return Response(orjson.dumps(obj), status=status, mimetype="application/json")
+
+async def read_json() -> dict | None:
+    """Parse the request body with orjson; None on empty or invalid JSON."""
+    try:
+        data = orjson.loads(await request.get_data())
+    except orjson.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+def bearer_token(req) -> str | None:
+    """Extract the token from a Bearer Authorization header, if present."""
+    header = req.headers.get("Authorization", "")
+    return header[7:] if header.startswith("Bearer ") else None
+
+def require_auth(func):
+    """Resolve the bearer token to a session and inject both into the view."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = bearer_token(request)
+        if token is None:
+            return fastjson({"success": False, "error": "No authorization"}, 401)
+        session = await session_store.get(token)
+        if not session:
+            return fastjson({"success": False, "error": "Session expired"}, 401)
+        return await func(*args, token=token, session=session, **kwargs)
+    return wrapper
+
 def librus_error_response(error_code: str, message: str | None = None):
     mapping = {
         "invalid_credentials": (401, "Nieprawidlowy login lub haslo"),
@@ -39,65 +167,56 @@ def librus_error_response(error_code: str, message: str | None = None):
         "internal_error": (500, "Wewnetrzny blad serwera."),
     }
     status, default_message = mapping.get(error_code, (500, "Blad komunikacji z Librusem."))
-    return jsonify({"success": False, "error": message or default_message, "code": error_code}), status
-
-def cleanup_old_sessions():
-    """Remove expired sessions."""
-    current_time = time.time()
-    expired = [k for k, v in sessions.items() if current_time - v.get("created", 0) > SESSION_TIMEOUT]
-    for k in expired:
-        del sessions[k]
-
-def get_session(token: str) -> dict:
-    """Get session by token, return None if expired."""
-    cleanup_old_sessions()
-    session = sessions.get(token)
-    if session:
-        if time.time() - session.get("created", 0) > SESSION_TIMEOUT:
-            del sessions[token]
-            return None
-    return session
+    return fastjson({"success": False, "error": message or default_message, "code": error_code}, status)
 
 # ========== LIBRUS ENDPOINTS ==========
 
 @app.route('/librus/login', methods=['POST'])
-def librus_login():
+async def librus_login():
     """Login to Librus and return session token."""
     trace_id = make_trace_id()
     started_at = time.monotonic()
     app.logger.info("[%s] POST /librus/login started", trace_id)
 
-    data = request.get_json(silent=True)
+    data = await read_json()
     if not data:
-        return jsonify({"success": False, "error": "No data provided"}), 400
-    
+        return fastjson({"success": False, "error": "No data provided"}, 400)
+
     login = data.get("login")
     password = data.get("password")
-    
+
     if not login or not password:
-        return jsonify({"success": False, "error": "Missing login or password"}), 400
-    
-    async def do_login():
-        api = LibrusAPI(trace_id=trace_id)
-        return await api.login(login, password)
-    
+        return fastjson({"success": False, "error": "Missing login or password"}, 400)
+
+    # Rate-limit by client IP, hashed so spoofed headers cannot bloat the map.
+    ip = (request.headers.get("X-Forwarded-For") or request.remote_addr or "").split(",")[0].strip()
+    rate_key = hashlib.sha256(ip.encode()).hexdigest()[:32]
+    attempts = await session_store.register_login_attempt(rate_key)
+    if attempts > MAX_LOGIN_ATTEMPTS:
+        app.logger.warning("[%s] POST /librus/login rate limited", trace_id)
+        return fastjson({
+            "success": False,
+            "error": "Zbyt wiele prob logowania. Sprobuj ponownie za kilka minut."
+        }, 429)
+
     try:
-        result = asyncio.run(do_login())
+        api = LibrusAPI(trace_id=trace_id)
+        result = await api.login(login, password)
     except Exception:
         app.logger.exception("[%s] POST /librus/login crashed", trace_id)
         return librus_error_response("internal_error")
-    
+
     if result.get("success"):
         # Create session token
         token = str(uuid.uuid4())
-        sessions[token] = {
+        await session_store.set(token, {
             "cookies": result["cookies"],
             "user": result.get("user"),
             "created": time.time()
-        }
-        
+        })
+
         app.logger.info("[%s] POST /librus/login finished in %.2fs", trace_id, time.monotonic() - started_at)
-        return jsonify({
+        return fastjson({
             "success": True,
             "token": token,
             "user": result.get("user"),
@@ -114,35 +233,24 @@ def librus_login():
     return librus_error_response(result.get("code", "internal_error"), result.get("error"))
 
 @app.route('/librus/attendances', methods=['GET'])
-def get_attendances():
+@cached_response(ttl=15)
+@require_auth
+async def get_attendances(token, session):
     """Get attendance data."""
     trace_id = make_trace_id()
     started_at = time.monotonic()
     app.logger.info("[%s] GET /librus/attendances started", trace_id)
 
-    auth = request.headers.get("Authorization")
-    if not auth or not auth.startswith("Bearer "):
-        return jsonify({"success": False, "error": "No authorization"}), 401
-    
-    token = auth.replace("Bearer ", "")
-    session = get_session(token)
-    
-    if not session:
-        return jsonify({"success": False, "error": "Session expired"}), 401
-    
-    async def fetch():
-        api = LibrusAPI(cookies=session["cookies"], trace_id=trace_id)
-        return await api.get_attendances()
-    
     try:
-        result = asyncio.run(fetch())
+        api = LibrusAPI(cookies=session["cookies"], trace_id=trace_id)
+        result = await singleflight((token, "attendances"), api.get_attendances)
     except Exception:
         app.logger.exception("[%s] GET /librus/attendances crashed", trace_id)
         return librus_error_response("internal_error")
-    
+
     if "error" in result:
         if result["error"] == "session_expired":
-            sessions.pop(token, None)
+            await session_store.delete(token)
         app.logger.warning(
             "[%s] GET /librus/attendances failed in %.2fs code=%s",
             trace_id,
@@ -152,39 +260,28 @@ def get_attendances():
         return librus_error_response(result["error"])
 
     app.logger.info("[%s] GET /librus/attendances finished in %.2fs", trace_id, time.monotonic() - started_at)
-    
-    return jsonify({"success": True, **result})
+
+    return fastjson({"success": True, **result})
 
 @app.route('/librus/grades', methods=['GET'])
-def get_grades():
+@cached_response(ttl=15)
+@require_auth
+async def get_grades(token, session):
     """Get grades data."""
     trace_id = make_trace_id()
     started_at = time.monotonic()
     app.logger.info("[%s] GET /librus/grades started", trace_id)
 
-    auth = request.headers.get("Authorization")
-    if not auth or not auth.startswith("Bearer "):
-        return jsonify({"success": False, "error": "No authorization"}), 401
-    
-    token = auth.replace("Bearer ", "")
-    session = get_session(token)
-    
-    if not session:
-        return jsonify({"success": False, "error": "Session expired"}), 401
-    
-    async def fetch():
-        api = LibrusAPI(cookies=session["cookies"], trace_id=trace_id)
-        return await api.get_grades()
-    
     try:
-        result = asyncio.run(fetch())
+        api = LibrusAPI(cookies=session["cookies"], trace_id=trace_id)
+        result = await singleflight((token, "grades"), api.get_grades)
     except Exception:
         app.logger.exception("[%s] GET /librus/grades crashed", trace_id)
         return librus_error_response("internal_error")
-    
+
     if "error" in result:
         if result["error"] == "session_expired":
-            sessions.pop(token, None)
+            await session_store.delete(token)
         app.logger.warning(
             "[%s] GET /librus/grades failed in %.2fs code=%s",
             trace_id,
@@ -194,79 +291,100 @@ def get_grades():
         return librus_error_response(result["error"])
 
     app.logger.info("[%s] GET /librus/grades finished in %.2fs", trace_id, time.monotonic() - started_at)
-    
-    return jsonify({"success": True, **result})
+
+    return fastjson({"success": True, **result})
 
 @app.route('/librus/me', methods=['GET'])
-def get_me():
+@cached_response(ttl=30)
+@require_auth
+async def get_me(token, session):
     """Get current user info."""
-    auth = request.headers.get("Authorization")
-    if not auth or not auth.startswith("Bearer "):
-        return jsonify({"success": False, "error": "No authorization"}), 401
-    
-    token = auth.replace("Bearer ", "")
-    session = get_session(token)
-    
-    if not session:
-        return jsonify({"success": False, "error": "Session expired"}), 401
-    
-    return jsonify({"success": True, "user": session.get("user")})
+    return fastjson({"success": True, "user": session.get("user")})
 
 @app.route('/librus/logout', methods=['POST'])
-def logout():
+async def logout():
     """Logout and invalidate session."""
-    auth = request.headers.get("Authorization")
-    if auth and auth.startswith("Bearer "):
-        token = auth.replace("Bearer ", "")
-        if token in sessions:
-            del sessions[token]
-    
-    return jsonify({"success": True, "message": "Wylogowano"})
+    token = bearer_token(request)
+    if token is not None:
+        await session_store.delete(token)
+        drop_cached_responses(request.headers["Authorization"])
+
+    return fastjson({"success": True, "message": "Wylogowano"})
 
 # ========== EDUPAGE PROXY ==========
 
 EDUPAGE_BASE = "https://zs2ostrzeszow.edupage.org"
 
+# Shared session for the EduPage proxy: keeps connections to the EduPage
+# host alive across requests, separate from the Librus pool.
+_edupage_session = None
+_edupage_lock = asyncio.Lock()
+
+async def get_edupage_session() -> aiohttp.ClientSession:
+    global _edupage_session
+    if _edupage_session is None or _edupage_session.closed:
+        async with _edupage_lock:
+            if _edupage_session is None or _edupage_session.closed:
+                _edupage_session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(limit=100, keepalive_timeout=60),
+                    timeout=aiohttp.ClientTimeout(total=30)
+                )
+    return _edupage_session
+
 @app.route('/edupage/proxy', methods=['POST'])
-def edupage_proxy():
-    """Proxy requests to EduPage."""
-    data = request.json
+async def edupage_proxy():
+    """Proxy requests to EduPage, streaming the upstream response."""
+    data = await read_json()
     if not data:
-        return jsonify({"error": "No data provided"}), 400
-    
+        return fastjson({"error": "No data provided"}, 400)
+
     path = data.get("path", "")
     body = data.get("body", {})
-    
-    try:
-        resp = requests.post(
-            EDUPAGE_BASE + path,
-            json=body,
-            headers={"Content-Type": "application/json"},
-            timeout=30
-        )
-        
+
+    session = await get_edupage_session()
+    # Retry once on connection setup failures (nothing was sent yet, so the
+    # POST is safe to reissue); other errors surface immediately.
+    for attempt in range(2):
+        try:
+            resp = await session.post(
+                EDUPAGE_BASE + path,
+                json=body,
+                headers={"Content-Type": "application/json"}
+            )
+            break
+        except aiohttp.ClientConnectorError as e:
+            if attempt == 1:
+                return fastjson({"error": str(e)}, 502)
+            await asyncio.sleep(0.1)
+        except Exception as e:
+            return fastjson({"error": str(e)}, 500)
+
+    async def stream():
         try:
-            return jsonify(resp.json())
-        except:
-            return resp.text, resp.status_code
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+            async for chunk in resp.content.iter_chunked(16384):
+                yield chunk
+        finally:
+            resp.release()
+
+    return stream(), resp.status, {
+        "Content-Type": resp.headers.get("Content-Type", "application/json")
+    }
 
 # ========== HEALTH CHECK ==========
 
 @app.route('/health', methods=['GET'])
-def health():
+async def health():
     """Health check endpoint."""
-    return jsonify({
+    return fastjson({
         "status": "ok",
-        "sessions": len(sessions),
+        "sessions": await session_store.count(),
         "time": time.strftime("%Y-%m-%d %H:%M:%S")
     })
 
 @app.route('/', methods=['GET'])
-def home():
+async def home():
     """Home page."""
-    return jsonify({
+    return fastjson({
         "name": "SchoolTimetable API",
         "version": "1.0.0",
         "endpoints": [
@@ -1,15 +1,85 @@
 import aiohttp
 import asyncio
+import functools
+import hashlib
 import logging
+import orjson
 import time
+from collections import OrderedDict
+
+from librus_transform import aggregate_attendances, aggregate_grades
 
 
 logger = logging.getLogger(__name__)
 
+# TTL cache for slow-changing lookups (subjects, teachers, lessons, types,
+# grade categories), keyed by (user cookie hash, lookup name). Bounded LRU
+# so abandoned sessions cannot grow it without limit.
+LOOKUP_CACHE_TTL = 600
+LOOKUP_CACHE_MAX = 1024
+LOOKUP_CACHE: OrderedDict = OrderedDict()
+
+
+def cached_lookup(ttl: float = LOOKUP_CACHE_TTL):
+    """Cache a per-user lookup coroutine for `ttl` seconds.
+
+    Empty results (no data or expired session) are never stored, so a
+    failed fetch is retried on the next call.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            if not self.cookies:
+                return await func(self, *args, **kwargs)
+            key = (self._cookies_key(), func.__name__)
+            now = time.monotonic()
+            entry = LOOKUP_CACHE.get(key)
+            if entry and entry[0] > now:
+                LOOKUP_CACHE.move_to_end(key)
+                return entry[1]
+            result = await func(self, *args, **kwargs)
+            if result:
+                LOOKUP_CACHE[key] = (now + ttl, result)
+                LOOKUP_CACHE.move_to_end(key)
+                while len(LOOKUP_CACHE) > LOOKUP_CACHE_MAX:
+                    LOOKUP_CACHE.popitem(last=False)
+            elif entry:
+                LOOKUP_CACHE.pop(key, None)
+            return result
+        return wrapper
+    return decorator
+
 class LibrusAPI:
+    # Shared session for data requests: reuses keep-alive connections to
+    # synergia.librus.pl across all users instead of paying TLS + DNS + TCP
+    # setup on every call. Per-user cookies are passed per request, and the
+    # jar is disabled so responses can never mix cookies between users.
+    _session: aiohttp.ClientSession | None = None
+    _session_lock = asyncio.Lock()
+
+    @classmethod
+    async def _get_shared_session(cls) -> aiohttp.ClientSession:
+        if cls._session is None or cls._session.closed:
+            async with cls._session_lock:
+                if cls._session is None or cls._session.closed:
+                    cls._session = aiohttp.ClientSession(
+                        connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300, keepalive_timeout=60),
+                        timeout=aiohttp.ClientTimeout(total=10),
+                        cookie_jar=aiohttp.DummyCookieJar()
+                    )
+        return cls._session
+
+    @classmethod
+    async def close_shared_session(cls) -> None:
+        """Close the shared session, e.g. on server shutdown."""
+        if cls._session is not None and not cls._session.closed:
+            await cls._session.close()
+        cls._session = None
+
     def __init__(self, cookies=None, trace_id: str | None = None):
         self.host = "https://synergia.librus.pl/gateway/api/2.0/"
         self.cookies = cookies
+        self._cookies_hash = None
         self.trace_id = trace_id or "librus"
         self.login_timeout = aiohttp.ClientTimeout(total=15, connect=10, sock_connect=10, sock_read=10)
         self.data_timeout = aiohttp.ClientTimeout(total=12, connect=8, sock_connect=8, sock_read=8)
@@ -34,6 +104,12 @@ class LibrusAPI:
     def _log(self, level: int, message: str, *args, **kwargs) -> None:
         logger.log(level, "[%s] " + message, self.trace_id, *args, **kwargs)
 
+    def _cookies_key(self) -> str:
+        if self._cookies_hash is None:
+            raw = "&".join(f"{k}={v}" for k, v in sorted(self.cookies.items()))
+            self._cookies_hash = hashlib.sha256(raw.encode()).hexdigest()
+        return self._cookies_hash
+
     def _mask_login(self, login: str) -> str:
         if len(login) <= 2:
             return "*" * len(login)
@@ -219,12 +295,14 @@ class LibrusAPI:
             self._log(logging.ERROR, "Unexpected activation error", exc_info=True)
             return False
     
-    async def _get_data_with_session(self, session, method: str):
+    async def _get_data_with_session(self, session, method: str, cookies: dict | None = None):
         """Get data from API using existing session."""
         try:
-            async with session.get(self.host + method, timeout=self.data_timeout) as resp:
+            async with session.get(self.host + method, timeout=self.data_timeout, cookies=cookies) as resp:
                 if resp.status == 200:
-                    return await resp.json(content_type=None)
+                    # orjson decodes the raw bytes several times faster than
+                    # stdlib json, which matters for large Attendances bodies.
+                    return orjson.loads(await resp.read())
                 if resp.status == 401:
                     self._log(logging.INFO, "Request %s returned 401", method)
                     return {"error": "session_expired"}
@@ -252,8 +330,8 @@ class LibrusAPI:
         if session is not None:
             return await self._get_data_with_session(session, method)
 
-        async with aiohttp.ClientSession(cookies=self.cookies, timeout=self.data_timeout) as new_session:
-            return await self._get_data_with_session(new_session, method)
+        shared = await self._get_shared_session()
+        return await self._get_data_with_session(shared, method, cookies=self.cookies)
     
     async def get_me(self, session: aiohttp.ClientSession | None = None):
         """Get current user info."""
@@ -262,6 +340,7 @@ class LibrusAPI:
             return data["Me"]["Account"]
         return None
     
+    @cached_lookup()
     async def get_subjects(self, session: aiohttp.ClientSession | None = None):
         """Get all subjects."""
         data = await self.get_data("Subjects", session=session)
@@ -269,6 +348,7 @@ class LibrusAPI:
             return {x["Id"]: x["Name"] for x in data["Subjects"]}
         return {}
     
+    @cached_lookup()
     async def get_teachers(self, session: aiohttp.ClientSession | None = None):
         """Get all teachers."""
         data = await self.get_data("Users", session=session)
@@ -281,6 +361,7 @@ class LibrusAPI:
             }
         return {}
     
+    @cached_lookup()
     async def get_lessons(self, session: aiohttp.ClientSession | None = None):
         """Get lessons mapping."""
         data = await self.get_data("Lessons", session=session)
@@ -288,6 +369,7 @@ class LibrusAPI:
             return {x["Id"]: x["Subject"]["Id"] for x in data["Lessons"]}
         return {}
     
+    @cached_lookup()
     async def get_attendance_types(self, session: aiohttp.ClientSession | None = None):
         """Get attendance types."""
         data = await self.get_data("Attendances/Types", session=session)
@@ -300,170 +382,58 @@ class LibrusAPI:
                 } for x in data["Types"]
             }
         return {}
-    
+
+    @cached_lookup()
+    async def get_grades_categories(self, session: aiohttp.ClientSession | None = None):
+        """Get grade categories mapping."""
+        data = await self.get_data("Grades/Categories", session=session)
+        if data and "Categories" in data:
+            return {
+                x["Id"]: {
+                    "name": x.get("Name", ""),
+                    "weight": x.get("Weight", 0)
+                } for x in data["Categories"]
+            }
+        return {}
+
     async def get_attendances(self):
         """Get all attendances with full details."""
         started_at = time.monotonic()
         self._log(logging.INFO, "Fetching attendances")
 
-        async with aiohttp.ClientSession(cookies=self.cookies, timeout=self.data_timeout) as session:
-            attendances_data = await self.get_data("Attendances", session=session)
-            if not attendances_data or "Attendances" not in attendances_data:
-                if attendances_data and "error" in attendances_data:
-                    return attendances_data
-                return {"error": "no_data"}
+        attendances_data, subjects, teachers, lessons, types = await asyncio.gather(
+            self.get_data("Attendances"),
+            self.get_subjects(),
+            self.get_teachers(),
+            self.get_lessons(),
+            self.get_attendance_types()
+        )
+        if not attendances_data or "Attendances" not in attendances_data:
+            if attendances_data and "error" in attendances_data:
+                return attendances_data
+            return {"error": "no_data"}
 
-            subjects, teachers, lessons, types = await asyncio.gather(
-                self.get_subjects(session=session),
-                self.get_teachers(session=session),
-                self.get_lessons(session=session),
-                self.get_attendance_types(session=session)
-            )
-        
-        result = []
-        stats = {
-            "present": 0,
-            "absent": 0,
-            "late": 0,
-            "excused": 0,
-            "other": 0
-        }
-        
-        # Per-subject stats
-        by_subject = {}
-        
-        for att in attendances_data["Attendances"]:
-            type_id = att.get("Type", {}).get("Id")
-            lesson_id = att.get("Lesson", {}).get("Id")
-            teacher_id = att.get("AddedBy", {}).get("Id")
-            
-            att_type = types.get(type_id, {})
-            subject_id = lessons.get(lesson_id)
-            subject_name = subjects.get(subject_id, "Nieznany")
-            teacher = teachers.get(teacher_id, {"FirstName": "", "LastName": ""})
-            
-            # Initialize subject stats if not exists
-            if subject_name not in by_subject:
-                by_subject[subject_name] = {"present": 0, "absent": 0, "late": 0, "excused": 0}
-            
-            # Categorize
-            short = att_type.get("short", "").lower()
-            is_presence = att_type.get("isPresence", False)
-            
-            if short == "sp" or "spóźn" in att_type.get("name", "").lower():
-                stats["late"] += 1
-                by_subject[subject_name]["late"] += 1
-                category = "late"
-            elif is_presence or short == "ob":
-                stats["present"] += 1
-                by_subject[subject_name]["present"] += 1
-                category = "present"
-            elif short in ["u", "nu", "us"]:
-                stats["excused"] += 1
-                by_subject[subject_name]["excused"] += 1
-                category = "excused"
-            elif short == "nb":
-                stats["absent"] += 1
-                by_subject[subject_name]["absent"] += 1
-                category = "absent"
-            else:
-                stats["other"] += 1
-                category = "other"
-            
-            result.append({
-                "date": att.get("Date"),
-                "subject": subject_name,
-                "type": att_type.get("name", ""),
-                "short": att_type.get("short", ""),
-                "category": category,
-                "semester": att.get("Semester", 1),
-                "teacher": f"{teacher.get('FirstName', '')} {teacher.get('LastName', '')}".strip()
-            })
-        
-        # Calculate percentage - present AND late counts (excused are still absences)
-        total = stats["present"] + stats["absent"] + stats["late"] + stats["excused"]
-        percentage = 0
-        if total > 0:
-            percentage = round((stats["present"] + stats["late"]) / total * 100)
-        
-        # Build per-subject list with percentages
-        subjects_list = []
-        for subj_name, subj_stats in sorted(by_subject.items()):
-            subj_total = subj_stats["present"] + subj_stats["absent"] + subj_stats["late"] + subj_stats["excused"]
-            # Present AND late counts as attendance
-            subj_pct = round((subj_stats["present"] + subj_stats["late"]) / subj_total * 100) if subj_total > 0 else 100
-            
-            subjects_list.append({
-                "name": subj_name,
-                "present": subj_stats["present"],
-                "excused": subj_stats["excused"],
-                "absent": subj_stats["absent"],
-                "late": subj_stats["late"],
-                "percentage": subj_pct
-            })
-        
-        # Sort by percentage descending (best first)
-        subjects_list.sort(key=lambda x: x["percentage"], reverse=True)
+        result = aggregate_attendances(attendances_data["Attendances"], subjects, teachers, lessons, types)
         self._log(logging.INFO, "Attendances fetched in %.2fs", time.monotonic() - started_at)
-        
-        return {
-            "attendances": result,
-            "stats": stats,
-            "percentage": percentage,
-            "total": total,
-            "bySubject": subjects_list
-        }
-    
+        return result
+
     async def get_grades(self):
         """Get all grades."""
         started_at = time.monotonic()
         self._log(logging.INFO, "Fetching grades")
 
-        async with aiohttp.ClientSession(cookies=self.cookies, timeout=self.data_timeout) as session:
-            grades_data, subjects, teachers, categories_data = await asyncio.gather(
-                self.get_data("Grades", session=session),
-                self.get_subjects(session=session),
-                self.get_teachers(session=session),
-                self.get_data("Grades/Categories", session=session)
-            )
+        grades_data, subjects, teachers, categories = await asyncio.gather(
+            self.get_data("Grades"),
+            self.get_subjects(),
+            self.get_teachers(),
+            self.get_grades_categories()
+        )
 
         if not grades_data or "Grades" not in grades_data:
             if grades_data and "error" in grades_data:
                 return grades_data
             return {"error": "no_data"}
 
-        categories = {}
-        if categories_data and "Categories" in categories_data:
-            for cat in categories_data["Categories"]:
-                categories[cat["Id"]] = {
-                    "name": cat.get("Name", ""),
-                    "weight": cat.get("Weight", 0)
-                }
-        
-        result = {}
-        for grade in grades_data["Grades"]:
-            subject_id = grade.get("Subject", {}).get("Id")
-            subject_name = subjects.get(subject_id, "Nieznany")
-            
-            if subject_name not in result:
-                result[subject_name] = []
-            
-            category_id = grade.get("Category", {}).get("Id")
-            category = categories.get(category_id, {})
-            teacher_id = grade.get("AddedBy", {}).get("Id")
-            teacher = teachers.get(teacher_id, {"FirstName": "", "LastName": ""})
-            
-            result[subject_name].append({
-                "grade": grade.get("Grade"),
-                "weight": category.get("weight", 0),
-                "category": category.get("name", ""),
-                "date": grade.get("Date"),
-                "addDate": grade.get("AddDate"),
-                "semester": grade.get("Semester"),
-                "isFinal": grade.get("IsFinal", False) or grade.get("IsFinalProposition", False),
-                "isSemester": grade.get("IsSemester", False) or grade.get("IsSemesterProposition", False),
-                "teacher": f"{teacher.get('FirstName', '')} {teacher.get('LastName', '')}".strip()
-            })
-
+        result = aggregate_grades(grades_data["Grades"], subjects, teachers, categories)
         self._log(logging.INFO, "Grades fetched in %.2fs", time.monotonic() - started_at)
-        return {"grades": result}
+        return result
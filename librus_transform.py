@@ -0,0 +1,161 @@
+"""Pure-Python transforms for Librus API responses.
+
+Kept free of I/O and fully annotated so the module can optionally be
+compiled with mypyc (``mypyc librus_transform.py``) for a faster
+aggregation pass; the interpreted version behaves identically.
+"""
+from collections import Counter, defaultdict
+from operator import itemgetter
+from typing import Any
+
+
+def build_type_categories(types: dict[int, dict[str, Any]]) -> dict[int, str]:
+    """Classify each attendance type once instead of per record."""
+    type_category: dict[int, str] = {}
+    for type_id, att_type in types.items():
+        short = att_type.get("short", "").lower()
+        if short == "sp" or "spóźn" in att_type.get("name", "").lower():
+            type_category[type_id] = "late"
+        elif att_type.get("isPresence", False) or short == "ob":
+            type_category[type_id] = "present"
+        elif short in ["u", "nu", "us"]:
+            type_category[type_id] = "excused"
+        elif short == "nb":
+            type_category[type_id] = "absent"
+        else:
+            type_category[type_id] = "other"
+    return type_category
+
+
+def aggregate_attendances(
+    attendances: list[dict[str, Any]],
+    subjects: dict[int, str],
+    teachers: dict[int, dict[str, str]],
+    lessons: dict[int, int],
+    types: dict[int, dict[str, Any]],
+) -> dict[str, Any]:
+    """Build the attendances payload: records, totals and per-subject stats."""
+    type_category = build_type_categories(types)
+
+    # Resolve lesson -> subject name once per lesson.
+    lesson_subject: dict[int, str] = {
+        lesson_id: subjects.get(subject_id, "Nieznany")
+        for lesson_id, subject_id in lessons.items()
+    }
+
+    result: list[Any] = [None] * len(attendances)
+    stats: Counter = Counter(present=0, absent=0, late=0, excused=0, other=0)
+
+    # Per-subject stats
+    by_subject: defaultdict = defaultdict(lambda: {"present": 0, "absent": 0, "late": 0, "excused": 0, "total": 0})
+
+    # Hoist lookups and shared defaults out of the loop so missing keys
+    # do not allocate a throwaway dict per record.
+    types_get = types.get
+    teachers_get = teachers.get
+    lesson_subject_get = lesson_subject.get
+    type_category_get = type_category.get
+    no_type: dict[str, Any] = {}
+    no_teacher = {"FirstName": "", "LastName": ""}
+
+    for i, att in enumerate(attendances):
+        type_ref = att.get("Type")
+        type_id = type_ref.get("Id") if type_ref else None
+        lesson_ref = att.get("Lesson")
+        lesson_id = lesson_ref.get("Id") if lesson_ref else None
+        added_by = att.get("AddedBy")
+        teacher_id = added_by.get("Id") if added_by else None
+
+        att_type = types_get(type_id, no_type)
+        subject_name = lesson_subject_get(lesson_id, "Nieznany")
+        teacher = teachers_get(teacher_id, no_teacher)
+        category = type_category_get(type_id, "other")
+
+        stats[category] += 1
+        # Materialize the subject entry for every record so subjects with
+        # only "other"-category records still appear in bySubject.
+        subj_stats = by_subject[subject_name]
+        if category != "other":
+            subj_stats[category] += 1
+            subj_stats["total"] += 1
+
+        result[i] = {
+            "date": att.get("Date"),
+            "subject": subject_name,
+            "type": att_type.get("name", ""),
+            "short": att_type.get("short", ""),
+            "category": category,
+            "semester": att.get("Semester", 1),
+            "teacher": f"{teacher['FirstName']} {teacher['LastName']}".strip()
+        }
+
+    # Calculate percentage - present AND late counts (excused are still absences)
+    total = stats["present"] + stats["absent"] + stats["late"] + stats["excused"]
+    percentage = 0
+    if total > 0:
+        percentage = round((stats["present"] + stats["late"]) / total * 100)
+
+    # Build per-subject list with percentages; totals were kept running
+    # during aggregation so they are not re-derived here.
+    subjects_list: list[dict[str, Any]] = []
+    for subj_name, subj_stats in sorted(by_subject.items()):
+        subj_total = subj_stats["total"]
+        # Present AND late counts as attendance
+        subj_pct = round((subj_stats["present"] + subj_stats["late"]) / subj_total * 100) if subj_total > 0 else 100
+
+        subjects_list.append({
+            "name": subj_name,
+            "present": subj_stats["present"],
+            "excused": subj_stats["excused"],
+            "absent": subj_stats["absent"],
+            "late": subj_stats["late"],
+            "percentage": subj_pct
+        })
+
+    # Sort by percentage descending (best first); itemgetter dispatches in C
+    subjects_list.sort(key=itemgetter("percentage"), reverse=True)
+
+    return {
+        "attendances": result,
+        "stats": dict(stats),
+        "percentage": percentage,
+        "total": total,
+        "bySubject": subjects_list
+    }
+
+
+def aggregate_grades(
+    grades: list[dict[str, Any]],
+    subjects: dict[int, str],
+    teachers: dict[int, dict[str, str]],
+    categories: dict[int, dict[str, Any]],
+) -> dict[str, Any]:
+    """Group grades by subject name with category and teacher resolved."""
+    result: defaultdict = defaultdict(list)
+    subjects_get = subjects.get
+    categories_get = categories.get
+    teachers_get = teachers.get
+    no_category: dict[str, Any] = {}
+    no_teacher = {"FirstName": "", "LastName": ""}
+
+    for grade in grades:
+        subject_ref = grade.get("Subject")
+        subject_name = subjects_get(subject_ref.get("Id") if subject_ref else None, "Nieznany")
+        category_ref = grade.get("Category")
+        category = categories_get(category_ref.get("Id") if category_ref else None, no_category)
+        added_by = grade.get("AddedBy")
+        teacher = teachers_get(added_by.get("Id") if added_by else None, no_teacher)
+
+        result[subject_name].append({
+            "grade": grade.get("Grade"),
+            "weight": category.get("weight", 0),
+            "category": category.get("name", ""),
+            "date": grade.get("Date"),
+            "addDate": grade.get("AddDate"),
+            "semester": grade.get("Semester"),
+            "isFinal": grade.get("IsFinal", False) or grade.get("IsFinalProposition", False),
+            "isSemester": grade.get("IsSemester", False) or grade.get("IsSemesterProposition", False),
+            "teacher": f"{teacher['FirstName']} {teacher['LastName']}".strip()
+        })
+
+    return {"grades": dict(result)}
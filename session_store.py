@@ -0,0 +1,134 @@
+"""Session storage backends.
+
+When REDIS_URL is set, sessions live in Redis with a native TTL so any
+number of workers can share them and state survives redeploys. Without
+it the in-process store is used, which keeps the free-tier setup
+dependency-free but limits the app to a single worker.
+"""
+import heapq
+import json
+import os
+import time
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+# Window for counting login attempts per client (seconds).
+LOGIN_WINDOW = 300
+
+
+class MemorySessionStore:
+    """In-process session store with a min-heap of expirations."""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._sessions = {}
+        self._expiry_heap = []
+        self._login_attempts = {}
+
+    async def get(self, token: str) -> dict | None:
+        session = self._sessions.get(token)
+        if session:
+            if time.time() - session.get("created", 0) > self.timeout:
+                del self._sessions[token]
+                return None
+        return session
+
+    async def set(self, token: str, session: dict) -> None:
+        created = session.get("created", time.time())
+        self._sessions[token] = session
+        heapq.heappush(self._expiry_heap, (created + self.timeout, created, token))
+
+    async def delete(self, token: str) -> None:
+        self._sessions.pop(token, None)
+
+    async def count(self) -> int:
+        return len(self._sessions)
+
+    async def register_login_attempt(self, key: str) -> int:
+        """Count a login attempt for `key`; resets after LOGIN_WINDOW."""
+        now = time.time()
+        count, window_start = self._login_attempts.get(key, (0, now))
+        if now - window_start >= LOGIN_WINDOW:
+            count, window_start = 0, now
+        count += 1
+        self._login_attempts[key] = (count, window_start)
+        return count
+
+    async def close(self) -> None:
+        pass
+
+    def cleanup(self) -> None:
+        """Remove expired sessions and stale rate-limit windows.
+
+        Called from the periodic sweeper, not the request path; get()
+        only checks the single requested token.
+        """
+        current_time = time.time()
+        while self._expiry_heap and self._expiry_heap[0][0] <= current_time:
+            _, created, token = heapq.heappop(self._expiry_heap)
+            session = self._sessions.get(token)
+            # Skip stale heap entries whose session was replaced or removed.
+            if session and session.get("created") == created:
+                del self._sessions[token]
+        expired = [
+            key for key, (_, window_start) in self._login_attempts.items()
+            if window_start + LOGIN_WINDOW < current_time
+        ]
+        for key in expired:
+            del self._login_attempts[key]
+
+
+class RedisSessionStore:
+    """Redis-backed session store; expiry is handled by Redis TTLs."""
+
+    KEY_PREFIX = "sess:"
+    RATE_PREFIX = "rl:"
+
+    def __init__(self, url: str, timeout: float):
+        self.timeout = timeout
+        self._redis = aioredis.from_url(url, decode_responses=True)
+
+    async def get(self, token: str) -> dict | None:
+        data = await self._redis.get(self.KEY_PREFIX + token)
+        if data is None:
+            return None
+        return json.loads(data)
+
+    async def set(self, token: str, session: dict) -> None:
+        await self._redis.setex(self.KEY_PREFIX + token, int(self.timeout), json.dumps(session))
+
+    async def delete(self, token: str) -> None:
+        await self._redis.delete(self.KEY_PREFIX + token)
+
+    async def count(self) -> int:
+        total = 0
+        async for _ in self._redis.scan_iter(match=self.KEY_PREFIX + "*"):
+            total += 1
+        return total
+
+    async def register_login_attempt(self, key: str) -> int:
+        """Count a login attempt for `key` via INCR; Redis expires the window."""
+        rate_key = self.RATE_PREFIX + key
+        count = await self._redis.incr(rate_key)
+        if count == 1:
+            await self._redis.expire(rate_key, LOGIN_WINDOW)
+        return count
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+    def cleanup(self) -> None:
+        """No-op: Redis expires sessions via its own TTLs."""
+
+
+def create_session_store(timeout: float):
+    """Pick the session backend from REDIS_URL."""
+    url = os.environ.get("REDIS_URL")
+    if url:
+        if aioredis is None:
+            raise RuntimeError("REDIS_URL is set but the redis package is not installed")
+        return RedisSessionStore(url, timeout)
+    return MemorySessionStore(timeout)